@@ -14,7 +14,15 @@ from utils import (
     save_changes_to_sheet,
     load_css,
     calculate_daily_summaries,
-    get_most_recent_activity
+    get_most_recent_activity,
+    load_snapshot,
+    save_snapshot,
+    snapshot_generation,
+    invalidate_snapshot,
+    reconcile_snapshot_in_background,
+    last_snapshot_sync,
+    sheet_watermark,
+    SheetChangedError
 )
 
 st.set_page_config(
@@ -252,18 +260,58 @@ st.title("👶 Suddu Tracker 👶")
 creds_dict = st.secrets["service_account"]
 sheet = initialize_google_sheets(creds_dict)
 
-# Load all data once at the beginning
-try:
-    data = load_sheet_data(sheet)
-except Exception as e:
-    st.error(f"Failed to connect to Google Sheets: {str(e)}")
-    data = None
-
 ist = pytz.timezone('Asia/Kolkata')
 now_ist = datetime.now(ist)
 
-# Process data
-df_all = process_dataframe(data, ist)
+# Local Arrow snapshot of the processed sheet for fast warm restarts
+SNAPSHOT_PATH = Path(__file__).parent / ".cache" / "baby_tracking.arrow"
+# Only mention the snapshot's age once it is older than this many seconds
+SNAPSHOT_NOTICE_AGE = 60
+
+# Serve from the snapshot if available and reconcile with the sheet in the background,
+# otherwise load all data from the sheet and write a fresh snapshot
+# Tell the user when a background sync (from any session) replaced the data they last saw
+last_sync = last_snapshot_sync()
+if 'seen_snapshot_sync' not in st.session_state:
+    st.session_state.seen_snapshot_sync = last_sync
+elif last_sync != st.session_state.seen_snapshot_sync:
+    st.session_state.seen_snapshot_sync = last_sync
+    st.toast("🔄 Loaded newer data from Google Sheets")
+
+df_all, snapshot_watermark = load_snapshot(SNAPSHOT_PATH)
+sync_started = False
+if df_all is not None:
+    sync_started = reconcile_snapshot_in_background(sheet, SNAPSHOT_PATH, ist)
+else:
+    generation = snapshot_generation()
+    try:
+        data = load_sheet_data(sheet)
+    except Exception as e:
+        st.error(f"Failed to connect to Google Sheets: {str(e)}")
+        data = None
+
+    # Process data
+    df_all = process_dataframe(data, ist)
+    try:
+        save_snapshot(df_all, data, SNAPSHOT_PATH, generation)
+    except Exception as e:
+        st.warning(f"Could not write local snapshot: {str(e)}")
+
+# Watermark of the sheet state df_all was built from, used to guard edits
+data_watermark = snapshot_watermark
+if data_watermark is None and df_all is not None:
+    data_watermark = sheet_watermark(data)
+
+# Warn when the metrics below come from an older snapshot that is being synced
+if sync_started and snapshot_watermark.get("fetched_at"):
+    snapshot_age = time.time() - snapshot_watermark["fetched_at"]
+    if snapshot_age > SNAPSHOT_NOTICE_AGE:
+        age_hours = int(snapshot_age // 3600)
+        age_minutes = int((snapshot_age % 3600) // 60)
+        st.caption(
+            f"⚡ Showing saved data from {age_hours}h {age_minutes}m ago while syncing with Google Sheets. "
+            f"Press 🔄 Refresh for the latest."
+        )
 
 # Display time elapsed since key activities
 st.subheader("⏱️ Time Since Last Activity")
@@ -350,6 +398,7 @@ with container1:
             date, time_str = get_ist_datetime()
             new_row = [date, time_str, action, ""]
             sheet.append_row(new_row)
+            invalidate_snapshot(SNAPSHOT_PATH)
             st.success(f"Recorded: {action} at {date} {time_str}")
 
 with container2:
@@ -359,10 +408,24 @@ with container2:
     col_refresh, col_save = st.columns([1, 4])
     with col_refresh:
         if st.button("🔄 Refresh", key="refresh_button"):
+            invalidate_snapshot(SNAPSHOT_PATH)
             st.rerun()
     
     # Load data
     df, df_recent, two_days_ago = load_recent_data(df_all, now_ist)
+
+    save_conflict = st.session_state.pop("save_conflict", False)
+    just_saved = st.session_state.pop("just_saved", False)
+    if save_conflict:
+        st.warning("The Google Sheet changed since this data was loaded, so nothing was saved. Please redo your edit on the current data.")
+
+    # Editor changes are tracked by row position, so drop them when the data underneath changes
+    if data_watermark is not None and st.session_state.get("editor_digest") != data_watermark["digest"]:
+        editor_state = st.session_state.pop("activity_editor", None) or {}
+        had_edits = any(editor_state.get(k) for k in ("edited_rows", "added_rows", "deleted_rows"))
+        if had_edits and not (save_conflict or just_saved):
+            st.warning("The activity data was updated from Google Sheets, so your unsaved edits were discarded. Please redo them.")
+        st.session_state.editor_digest = data_watermark["digest"]
     
     # Create a placeholder for the data editor
     data_placeholder = st.empty()
@@ -378,8 +441,15 @@ with container2:
             save_clicked = st.button("💾 Save Changes", key="save_button")
         
         if save_clicked:
-            changes_saved = save_changes_to_sheet(sheet, df, df_recent, edited_df, two_days_ago, ist)
+            try:
+                changes_saved = save_changes_to_sheet(sheet, df, df_recent, edited_df, two_days_ago, ist, data_watermark)
+            except SheetChangedError:
+                invalidate_snapshot(SNAPSHOT_PATH)
+                st.session_state.save_conflict = True
+                st.rerun()
             if changes_saved:
+                invalidate_snapshot(SNAPSHOT_PATH)
+                st.session_state.just_saved = True
                 st.success("Changes saved to Google Sheet!")
                 st.rerun()
             else:
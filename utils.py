@@ -1,11 +1,35 @@
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
 import pytz
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
 import streamlit as st
 from pathlib import Path
 
+# Bump whenever the snapshot layout or process_dataframe output changes
+SNAPSHOT_VERSION = 1
+SNAPSHOT_METADATA_KEY = b"baby_tracking_snapshot"
+
+logger = logging.getLogger(__name__)
+
+_reconcile_lock = threading.Lock()
+
+# Guards snapshot writes and deletes. The generation is bumped on every invalidation
+# so writers that fetched the sheet before it can discard their now-stale result.
+_snapshot_lock = threading.Lock()
+_snapshot_generation = 0
+# Time of the last background sync that rewrote the snapshot, shared by all sessions
+_last_snapshot_sync = None
+
 
 def load_css(app_dir=None):
     """
@@ -52,36 +76,213 @@ def initialize_google_sheets(creds_dict):
     sheet = client.open("baby_tracking").sheet1
     return sheet
 
-def process_dataframe(data, ist):
-    """Process raw sheet data into a pandas DataFrame with datetime column"""
+class MissingColumnsError(ValueError):
+    """Raised when the sheet is missing any of the required columns"""
+
+    def __init__(self, missing_columns, available_columns):
+        super().__init__(f"Missing required columns in sheet: {', '.join(missing_columns)}")
+        self.missing_columns = missing_columns
+        self.available_columns = available_columns
+
+class SheetChangedError(Exception):
+    """Raised when the sheet no longer matches the data an edit was made against"""
+
+def build_dataframe(data, ist):
+    """
+    Build the processed DataFrame from raw sheet data without touching the Streamlit UI.
+    Returns None for an empty sheet and raises MissingColumnsError if required columns are missing.
+    """
     if not data or len(data) <= 1:
         return None
-    
+
+    headers = data[0]
+    records = data[1:]
+
+    df_all = pd.DataFrame(records, columns=headers)
+
+    # Strip whitespace from column names
+    df_all.columns = df_all.columns.str.strip()
+
+    # Verify required columns exist
+    required_columns = ['Date', 'Time', 'Action']
+    missing_columns = [col for col in required_columns if col not in df_all.columns]
+
+    if missing_columns:
+        raise MissingColumnsError(missing_columns, df_all.columns.tolist())
+
+    df_all["datetime"] = pd.to_datetime(df_all["Date"] + " " + df_all["Time"])
+    df_all["datetime"] = df_all["datetime"].dt.tz_localize(ist, ambiguous='NaT', nonexistent='shift_forward')
+    return df_all
+
+def process_dataframe(data, ist):
+    """Process raw sheet data into a pandas DataFrame with datetime column"""
     try:
-        headers = data[0]
-        records = data[1:]
-        
-        df_all = pd.DataFrame(records, columns=headers)
-        
-        # Strip whitespace from column names
-        df_all.columns = df_all.columns.str.strip()
-        
-        # Verify required columns exist
-        required_columns = ['Date', 'Time', 'Action']
-        missing_columns = [col for col in required_columns if col not in df_all.columns]
-        
-        if missing_columns:
-            st.error(f"Missing required columns in sheet: {', '.join(missing_columns)}")
-            st.info(f"Available columns: {', '.join(df_all.columns.tolist())}")
-            return None
-        
-        df_all["datetime"] = pd.to_datetime(df_all["Date"] + " " + df_all["Time"])
-        df_all["datetime"] = df_all["datetime"].dt.tz_localize(ist, ambiguous='NaT', nonexistent='shift_forward')
-        return df_all
+        return build_dataframe(data, ist)
+    except MissingColumnsError as e:
+        st.error(str(e))
+        st.info(f"Available columns: {', '.join(e.available_columns)}")
+        return None
     except Exception as e:
         st.error(f"Error processing data: {str(e)}")
         return None
 
+def _sheet_fingerprint(data):
+    """Return (row_count, content hash) watermark for raw sheet data"""
+    row_count = max(len(data) - 1, 0) if data else 0
+    digest = hashlib.sha256(json.dumps(data or []).encode("utf-8")).hexdigest()
+    return row_count, digest
+
+def sheet_watermark(data):
+    """Return the row-count and content-hash watermark dict for raw sheet data"""
+    row_count, digest = _sheet_fingerprint(data)
+    return {"row_count": row_count, "digest": digest}
+
+def snapshot_generation():
+    """Return the current snapshot generation; capture it before fetching the sheet"""
+    with _snapshot_lock:
+        return _snapshot_generation
+
+def last_snapshot_sync():
+    """Return when a background sync last rewrote the snapshot, or None if it never has"""
+    with _snapshot_lock:
+        return _last_snapshot_sync
+
+def save_snapshot(df_all, data, snapshot_path, generation=None):
+    """
+    Persist the processed dataframe to an uncompressed Arrow (Feather v2) file so it
+    can be memory-mapped on the next startup. The schema metadata carries the snapshot
+    version plus a row-count and content-hash watermark of the sheet it was built from.
+    The file is written to a temporary path and swapped in atomically.
+
+    If `generation` is given and the snapshot was invalidated since it was taken, the
+    data is considered stale and nothing is written. Returns True if the file was written.
+    """
+    if df_all is None:
+        return False
+    snapshot_path = Path(snapshot_path)
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+
+    row_count, digest = _sheet_fingerprint(data)
+    table = pa.Table.from_pandas(df_all.reset_index(drop=True), preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[SNAPSHOT_METADATA_KEY] = json.dumps({
+        "version": SNAPSHOT_VERSION,
+        "row_count": row_count,
+        "digest": digest,
+        "fetched_at": time.time(),
+    }).encode("utf-8")
+    table = table.replace_schema_metadata(metadata)
+
+    # Sessions run as threads of one process, so each writer needs its own temp file
+    with tempfile.NamedTemporaryFile(dir=snapshot_path.parent, suffix=".tmp", delete=False) as tmp:
+        tmp_path = tmp.name
+    try:
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+        with _snapshot_lock:
+            if generation is not None and generation != _snapshot_generation:
+                Path(tmp_path).unlink(missing_ok=True)
+                return False
+            os.replace(tmp_path, snapshot_path)
+    except Exception:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+    return True
+
+def read_snapshot_watermark(snapshot_path):
+    """Return the snapshot's metadata dict, or None if missing, unreadable or from another version"""
+    snapshot_path = Path(snapshot_path)
+    if not snapshot_path.exists():
+        return None
+    try:
+        with pa.memory_map(str(snapshot_path)) as source:
+            schema = pa.ipc.open_file(source).schema
+        watermark = json.loads(schema.metadata[SNAPSHOT_METADATA_KEY])
+    except Exception:
+        return None
+    if watermark.get("version") != SNAPSHOT_VERSION:
+        return None
+    return watermark
+
+def load_snapshot(snapshot_path):
+    """
+    Load the processed dataframe from a local snapshot via a memory-mapped read.
+    Returns (df_all, watermark), or (None, None) if the snapshot is missing, corrupt or
+    written by a different SNAPSHOT_VERSION, in which case the caller should fall back
+    to the sheet.
+    """
+    watermark = read_snapshot_watermark(snapshot_path)
+    if watermark is None:
+        return None, None
+    try:
+        return feather.read_table(Path(snapshot_path), memory_map=True).to_pandas(), watermark
+    except Exception:
+        return None, None
+
+def invalidate_snapshot(snapshot_path):
+    """
+    Delete the snapshot so the next run reloads straight from the sheet, and bump the
+    generation so in-flight fetches started before this call cannot write it back.
+    """
+    global _snapshot_generation
+    with _snapshot_lock:
+        _snapshot_generation += 1
+        Path(snapshot_path).unlink(missing_ok=True)
+
+def _reconcile_snapshot(sheet, snapshot_path, ist):
+    """Worker-thread body of reconcile_snapshot_in_background; must always release _reconcile_lock"""
+    global _last_snapshot_sync
+    try:
+        generation = snapshot_generation()
+        data = sheet.get_all_values()
+        row_count, digest = _sheet_fingerprint(data)
+        watermark = read_snapshot_watermark(snapshot_path)
+        if watermark and watermark["row_count"] == row_count and watermark["digest"] == digest:
+            return
+        try:
+            df_all = build_dataframe(data, ist)
+        except Exception:
+            # Drop the snapshot so the next run reports the error via process_dataframe
+            logger.exception("Could not process sheet data; invalidating snapshot at %s", snapshot_path)
+            invalidate_snapshot(snapshot_path)
+            return
+        if df_all is None:
+            # Drop the snapshot so the next run shows the empty state instead of deleted rows
+            logger.warning("Sheet returned no rows; invalidating snapshot at %s", snapshot_path)
+            invalidate_snapshot(snapshot_path)
+            return
+        if save_snapshot(df_all, data, snapshot_path, generation):
+            with _snapshot_lock:
+                _last_snapshot_sync = time.time()
+        else:
+            logger.info("Discarded background snapshot for %s; it was invalidated mid-fetch", snapshot_path)
+    except Exception:
+        # Keep serving the existing snapshot; the next run will try again
+        logger.exception("Background snapshot reconciliation failed for %s", snapshot_path)
+    finally:
+        _reconcile_lock.release()
+
+def reconcile_snapshot_in_background(sheet, snapshot_path, ist):
+    """
+    Refresh the snapshot from the sheet on a background thread. The snapshot is only
+    rewritten when the sheet's row count or content differs from its watermark, and
+    at most one reconciliation runs at a time. When it is rewritten, last_snapshot_sync()
+    is updated so every session can tell its user on its next run. Returns True if a
+    thread was started.
+    """
+    if not _reconcile_lock.acquire(blocking=False):
+        return False
+    thread = threading.Thread(
+        target=_reconcile_snapshot,
+        args=(sheet, snapshot_path, ist),
+        daemon=True,
+    )
+    try:
+        thread.start()
+    except Exception:
+        _reconcile_lock.release()
+        raise
+    return True
+
 def load_recent_data(df_all, now_ist):
     """Filter dataframe for last 2 days and sort by datetime"""
     if df_all is not None:
@@ -91,8 +292,25 @@ def load_recent_data(df_all, now_ist):
         return df_all, df_recent, two_days_ago
     return None, None, None
 
-def save_changes_to_sheet(sheet, df, df_recent, edited_df, two_days_ago, ist):
-    """Save edited dataframe changes back to Google Sheet"""
+def _sheet_row_mapping(data, ist):
+    """Map each raw sheet row's datetime to its 1-indexed sheet row number"""
+    if not data:
+        return {}
+    df_sheet = pd.DataFrame(data[1:], columns=data[0])
+    df_sheet["datetime"] = pd.to_datetime(df_sheet["Date"] + " " + df_sheet["Time"])
+    df_sheet["datetime"] = df_sheet["datetime"].dt.tz_localize(ist, ambiguous='NaT', nonexistent='shift_forward')
+
+    datetime_to_sheet_row = {}
+    for idx, row in df_sheet.iterrows():
+        datetime_to_sheet_row[row["datetime"]] = idx + 2  # +2 for header and 1-indexing
+    return datetime_to_sheet_row
+
+def save_changes_to_sheet(sheet, df, df_recent, edited_df, two_days_ago, ist, watermark=None):
+    """
+    Save edited dataframe changes back to Google Sheet. If `watermark` (see sheet_watermark)
+    is given and the sheet has changed since `df` was loaded, SheetChangedError is raised
+    before anything is written.
+    """
     # Recreate datetime column in edited_df from Date and Time columns
     edited_df["datetime"] = pd.to_datetime(edited_df["Date"] + " " + edited_df["Time"])
     edited_df["datetime"] = edited_df["datetime"].dt.tz_localize(ist, ambiguous='NaT', nonexistent='shift_forward')
@@ -116,10 +334,13 @@ def save_changes_to_sheet(sheet, df, df_recent, edited_df, two_days_ago, ist):
             has_changes = True
     
     if has_changes:
-        # Create a mapping of datetime to sheet row for the full dataset
-        datetime_to_sheet_row = {}
-        for idx, row in df.iterrows():
-            datetime_to_sheet_row[row["datetime"]] = idx + 2  # +2 for header and 1-indexing
+        # df may come from a snapshot; refuse to write edits made against outdated data
+        data = sheet.get_all_values()
+        if watermark is not None and _sheet_fingerprint(data) != (watermark["row_count"], watermark["digest"]):
+            raise SheetChangedError("The Google Sheet changed since this data was loaded")
+
+        # Map datetime to sheet row from the fresh read
+        datetime_to_sheet_row = _sheet_row_mapping(data, ist)
         
         # Get column names from the dataframe (excluding datetime)
         data_columns = [col for col in edited_df.columns if col != "datetime"]
@@ -130,20 +351,17 @@ def save_changes_to_sheet(sheet, df, df_recent, edited_df, two_days_ago, ist):
         deleted_datetimes = original_datetimes - edited_datetimes
         
         # Delete rows (in reverse order to avoid row number shifting)
-        rows_to_delete = sorted([datetime_to_sheet_row[dt] for dt in deleted_datetimes], reverse=True)
+        # Rows already gone from the sheet are skipped
+        rows_to_delete = sorted(
+            [datetime_to_sheet_row[dt] for dt in deleted_datetimes if dt in datetime_to_sheet_row],
+            reverse=True
+        )
         for sheet_row in rows_to_delete:
             sheet.delete_rows(sheet_row)
         
         # Update the datetime_to_sheet_row mapping after deletions
         # Reload the sheet to get accurate row numbers
-        data = sheet.get_all_values()
-        df_refreshed = pd.DataFrame(data[1:], columns=data[0])
-        df_refreshed["datetime"] = pd.to_datetime(df_refreshed["Date"] + " " + df_refreshed["Time"])
-        df_refreshed["datetime"] = df_refreshed["datetime"].dt.tz_localize(ist, ambiguous='NaT', nonexistent='shift_forward')
-        
-        datetime_to_sheet_row = {}
-        for idx, row in df_refreshed.iterrows():
-            datetime_to_sheet_row[row["datetime"]] = idx + 2
+        datetime_to_sheet_row = _sheet_row_mapping(sheet.get_all_values(), ist)
         
         # Update or add rows using datetime matching
         for idx, edited_row in edited_df.iterrows():